@@ -2,53 +2,169 @@
 
 from __future__ import annotations
 
-from functools import lru_cache
+import os
+import tempfile
 from pathlib import Path
-from typing import Dict, List, Tuple
+from typing import Dict, List, Optional, Set, Tuple
 
 import gradio as gr
+import numpy as np
+from PIL import Image
 
-from pdf_generator import GameAssets, generate_pdf, list_games
+from pdf_generator import (
+    DEFAULT_DPI,
+    RESAMPLE,
+    CardAsset,
+    GameAssets,
+    generate_pdf,
+    load_game,
+)
 
 
 BASE_DIR = Path("Juegos")
 OUTPUT_DIR = Path("documentos")
+THUMBNAIL_DIRNAME = ".thumbs"
+THUMBNAIL_HEIGHT = 160
 
 BASE_DIR.mkdir(parents=True, exist_ok=True)
 OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
 
 
-@lru_cache(maxsize=1)
-def _initial_games() -> Dict[str, GameAssets]:
-    return list_games(BASE_DIR)
+# Scan results keyed by directory mtimes: the base folder's mtime only changes
+# when games are added or removed, and a game folder's when its files change.
+_base_mtime: Optional[int] = None
+_game_folders: List[Path] = []
+_folder_games: Dict[Path, Tuple[int, Optional[GameAssets]]] = {}
+_static_thumbnail_dirs: Set[Path] = set()
+
+
+def _cached_games() -> Dict[str, GameAssets]:
+    global _base_mtime, _game_folders
+
+    base_mtime = BASE_DIR.stat().st_mtime_ns
+    if base_mtime != _base_mtime:
+        _game_folders = sorted(p for p in BASE_DIR.iterdir() if p.is_dir())
+        _base_mtime = base_mtime
+
+    games: Dict[str, GameAssets] = {}
+    scanned: Dict[Path, Tuple[int, Optional[GameAssets]]] = {}
+    for folder in _game_folders:
+        try:
+            folder_mtime = folder.stat().st_mtime_ns
+        except FileNotFoundError:
+            continue
+        cached = _folder_games.get(folder)
+        if cached is not None and cached[0] == folder_mtime:
+            assets = cached[1]
+        else:
+            assets = load_game(folder)
+        scanned[folder] = (folder_mtime, assets)
+        if assets is not None:
+            games[assets.name] = assets
+
+    _folder_games.clear()
+    _folder_games.update(scanned)
+    return games
+
+
+def _invalidate_games() -> None:
+    global _base_mtime
+
+    _base_mtime = None
+    _folder_games.clear()
+
+
+def _ensure_thumbnail(card: CardAsset) -> Path:
+    # Named after the card key so "X.png" and "X.jpg" never share a thumbnail.
+    thumbnail = card.path.parent / THUMBNAIL_DIRNAME / f"{card.key}.jpg"
+    try:
+        if thumbnail.stat().st_mtime_ns >= card.path.stat().st_mtime_ns:
+            return thumbnail
+    except FileNotFoundError:
+        pass
+
+    try:
+        _write_thumbnail(card, thumbnail)
+    except OSError:
+        # Unreadable or truncated card files (UnidentifiedImageError is an
+        # OSError) must not stop the app; show the original file instead.
+        return card.path
+    return thumbnail
+
+
+def _write_thumbnail(card: CardAsset, thumbnail: Path) -> None:
+    thumbnail.parent.mkdir(exist_ok=True)
+    with Image.open(card.path) as source:
+        image = source.convert("RGB")
+    width = max(1, round(image.width * THUMBNAIL_HEIGHT / image.height))
+    resized = image.resize((width, THUMBNAIL_HEIGHT), RESAMPLE)
+
+    # Several sessions may render the same form, so publish the file atomically.
+    fd, temp_name = tempfile.mkstemp(dir=thumbnail.parent, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as handle:
+            resized.save(handle, "JPEG", quality=85)
+        os.replace(temp_name, thumbnail)
+    except BaseException:
+        Path(temp_name).unlink(missing_ok=True)
+        raise
+
+
+def _ensure_thumbnails(games: Dict[str, GameAssets]) -> None:
+    for assets in games.values():
+        for card in assets.front_cards:
+            _ensure_thumbnail(card)
+
+    # gr.set_static_paths appends to a global list, so only pass new folders.
+    folders = {
+        (assets.back_card.path.parent / THUMBNAIL_DIRNAME).resolve()
+        for assets in games.values()
+    }
+    new_folders = sorted(folders - _static_thumbnail_dirs)
+    if new_folders:
+        gr.set_static_paths(new_folders)
+        _static_thumbnail_dirs.update(new_folders)
 
 
 def _game_metadata() -> List[Tuple[str, GameAssets]]:
-    games = _initial_games()
+    games = _cached_games()
     sorted_names = sorted(games.keys())
     return [(name, games[name]) for name in sorted_names]
 
 
-def generate_document(game_name: str, *counts: float):
-    games = list_games(BASE_DIR)
+def generate_document(
+    game_name: str,
+    counts: Dict[str, Dict[str, int]],
+    dpi: float = DEFAULT_DPI,
+):
+    games = _cached_games()
     if game_name not in games:
         raise gr.Error(
             "Selecciona un juego válido antes de generar el documento.")
 
     game = games[game_name]
 
-    cards_order = [card.name for card in game.front_cards]
-    count_mapping = {name: 0 for name in cards_order}
-
-    relevant_counts = counts[: len(cards_order)]
-    for card_name, value in zip(cards_order, relevant_counts):
-        count_mapping[card_name] = int(value)
+    game_counts = counts.get(game_name, {})
+    card_keys = list(game.cards_by_key)
+    requested = np.asarray(
+        [game_counts.get(key, 0) for key in card_keys], dtype=np.int32
+    )
+    count_mapping = dict(zip(card_keys, np.clip(requested, 0, None).tolist()))
 
-    pdf_path = generate_pdf(game, count_mapping, OUTPUT_DIR)
+    pdf_path = generate_pdf(game, count_mapping, OUTPUT_DIR, dpi=int(dpi))
     return str(pdf_path)
 
 
+def _count_updater(game_name: str, card_key: str):
+    def _update(value: float, state: Dict[str, Dict[str, int]]):
+        game_counts = {**state.get(game_name, {}), card_key: int(value or 0)}
+        return {**state, game_name: game_counts}
+
+    return _update
+
+
 metadata = _game_metadata()
+_ensure_thumbnails(dict(metadata))
 game_names = [name for name, _ in metadata]
 
 
@@ -72,58 +188,86 @@ with gr.Blocks(title="Generador de Cartas") as demo:
         interactive=True,
     )
 
+    dpi_slider = gr.Slider(
+        label="Resolución (DPI)",
+        minimum=75,
+        maximum=DEFAULT_DPI,
+        step=25,
+        value=DEFAULT_DPI,
+        interactive=True,
+    )
+
     form_host = gr.Column()
     generate_button = gr.Button("Generar documento", interactive=False)
     output_file = gr.File(label="Documento generado")
 
-    number_inputs: List[gr.Number] = []
-    form_columns: Dict[str, gr.Column] = {}
+    # Quantities keyed by game and card, so a submit sends one value instead of
+    # every Number component.
+    counts_state = gr.State({})
 
     with form_host:
-        for game_name, assets in metadata:
-            visible = game_name == game_names[0] if game_names else False
-            with gr.Column(visible=visible) as card_form:
-                form_columns[game_name] = card_form
-                for card in assets.front_cards:
-                    gr.Markdown(f"### {card.name}")
-                    with gr.Row():
-                        gr.Image(
-                            value=str(card.path),
-                            height=160,
-                            interactive=False,
-                            show_label=False,
-                        )
-                        number = gr.Number(
-                            label="Cantidad",
-                            value=0,
-                            precision=0,
-                            minimum=0,
-                            maximum=10,
-                            interactive=True,
-                        )
-                        number_inputs.append(number)
+        @gr.render(inputs=game_dropdown)
+        def _render_card_form(selected: str):
+            assets = _cached_games().get(selected)
+            if assets is None:
+                return
+
+            number_inputs: List[gr.Number] = []
+            for card in assets.front_cards:
+                gr.Markdown(f"### {card.name}")
+                with gr.Row():
+                    gr.Image(
+                        value=str(_ensure_thumbnail(card)),
+                        height=160,
+                        interactive=False,
+                        show_label=False,
+                    )
+                    number = gr.Number(
+                        label="Cantidad",
+                        value=0,
+                        precision=0,
+                        minimum=0,
+                        maximum=10,
+                        interactive=True,
+                    )
+                    number_inputs.append(number)
+                    number.change(
+                        _count_updater(selected, card.key),
+                        inputs=[number, counts_state],
+                        outputs=counts_state,
+                        concurrency_limit=1,
+                        concurrency_id="card_counts",
+                    )
+
+            def _apply_global_quantity(value: float):
+                clamped = max(0, min(10, int(value)))
+                return tuple(gr.update(value=clamped) for _ in number_inputs)
+
+            bulk_number.change(
+                _apply_global_quantity,
+                inputs=bulk_number,
+                outputs=number_inputs,
+            )
 
     if game_names:
         generate_button.interactive = True
 
     def _on_game_change(selected: str):
-        updates = []
-        for name in form_columns:
-            updates.append(gr.update(visible=(name == selected)))
-
-        button_update = gr.Button.update(interactive=selected in form_columns)
-        file_update = gr.File.update(value=None)
-        return (*updates, button_update, file_update)
+        # The form is rebuilt with every quantity at zero, so drop stale counts.
+        button_update = gr.update(interactive=selected in _cached_games())
+        file_update = gr.update(value=None)
+        return button_update, file_update, {}
 
     game_dropdown.change(
         _on_game_change,
         inputs=game_dropdown,
-        outputs=[*form_columns.values(), generate_button, output_file],
+        outputs=[generate_button, output_file, counts_state],
     )
 
     def _refresh_games():
-        _initial_games.cache_clear()
-        games = list_games(BASE_DIR)
+        _invalidate_games()
+        games = _cached_games()
+        _ensure_thumbnails(games)
         options = sorted(games.keys())
         if not options:
             return gr.update(choices=[], value=None, interactive=False)
@@ -133,21 +277,10 @@ with gr.Blocks(title="Generador de Cartas") as demo:
 
     generate_button.click(
         generate_document,
-        inputs=[game_dropdown, *number_inputs],
+        inputs=[game_dropdown, counts_state, dpi_slider],
         outputs=output_file,
     )
 
-    if number_inputs:
-        def _apply_global_quantity(value: float):
-            clamped = max(0, min(10, int(value)))
-            return tuple(gr.update(value=clamped) for _ in number_inputs)
-
-        bulk_number.change(
-            _apply_global_quantity,
-            inputs=bulk_number,
-            outputs=number_inputs,
-        )
-
 
 if __name__ == "__main__":
     demo.launch(server_port=8005, server_name="0.0.0.0")
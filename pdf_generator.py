@@ -2,14 +2,37 @@
 
 from __future__ import annotations
 
-from dataclasses import dataclass
+import os
+import threading
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
 from datetime import datetime
+from functools import lru_cache
+from itertools import chain, groupby, repeat
 from pathlib import Path
-from typing import Dict, Iterable, Iterator, List, Sequence, Tuple
-
-from PIL import Image, ImageDraw, ImageOps
-
-
+from types import MappingProxyType
+from typing import (
+    Deque,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Mapping,
+    Optional,
+    Sequence,
+    Tuple,
+)
+
+import numpy as np
+from PIL import Image, ImageOps
+
+from pdf_kernels import blit_card
+from pdf_writer import PdfStreamWriter
+
+
+# Page geometry at DEFAULT_DPI; other resolutions scale it proportionally.
+DEFAULT_DPI = 300
 PAGE_WIDTH = 3111
 PAGE_HEIGHT = 4404
 CARD_WIDTH = 796
@@ -20,6 +43,11 @@ COLUMN_COUNT = 3
 ROW_COUNT = 3
 CARDS_PER_PAGE = COLUMN_COUNT * ROW_COUNT
 
+# Each render worker holds one finished page plus its own page buffer (about
+# 41 MB each at DEFAULT_DPI), so the pool stays small even on large hosts.
+_RENDER_WORKERS = min(4, os.cpu_count() or 1)
+_page_buffers = threading.local()
+
 ALLOWED_EXTENSIONS = {".png", ".jpg", ".jpeg", ".webp", ".bmp"}
 
 
@@ -29,28 +57,40 @@ except AttributeError:  # Pillow < 10
     RESAMPLE = Image.LANCZOS  # type: ignore[attr-defined]
 
 
-def _create_card_mask() -> Image.Image:
-    mask = Image.new("L", (CARD_WIDTH, CARD_HEIGHT), 0)
-    draw = ImageDraw.Draw(mask)
-    radius = min(CARD_CORNER_RADIUS, CARD_WIDTH // 2, CARD_HEIGHT // 2)
-    draw.rounded_rectangle((0, 0, CARD_WIDTH, CARD_HEIGHT), radius=radius, fill=255)
-    return mask
-
-
-_CARD_ALPHA_MASK = _create_card_mask()
-
-
 @dataclass(frozen=True)
 class CardAsset:
     name: str
     path: Path
 
+    @property
+    def key(self) -> str:
+        """Unique identifier of the card within its game: its file name."""
+
+        return self.path.name
+
 
 @dataclass(frozen=True)
 class GameAssets:
     name: str
     front_cards: Sequence[CardAsset]
     back_card: CardAsset
+    cards_by_key: Mapping[str, CardAsset] = field(
+        init=False, compare=False, repr=False
+    )
+
+    def __post_init__(self) -> None:
+        cards_by_key = {card.key: card for card in self.front_cards}
+        object.__setattr__(self, "cards_by_key", MappingProxyType(cards_by_key))
+
+
+@dataclass(frozen=True)
+class _PageLayout:
+    page_width: int
+    page_height: int
+    card_width: int
+    card_height: int
+    positions: Tuple[Tuple[int, int], ...]
+    card_mask: np.ndarray = field(compare=False, repr=False)
 
 
 def list_games(base_dir: Path | str) -> Dict[str, GameAssets]:
@@ -61,28 +101,43 @@ def list_games(base_dir: Path | str) -> Dict[str, GameAssets]:
 
     games: Dict[str, GameAssets] = {}
     for folder in sorted(p for p in base_path.iterdir() if p.is_dir()):
-        try:
-            assets = _load_game_assets(folder)
-        except ValueError:
-            continue
-        if assets.front_cards:
+        assets = load_game(folder)
+        if assets is not None:
             games[assets.name] = assets
 
     return games
 
 
+def load_game(folder: Path) -> Optional[GameAssets]:
+    """Return the game stored in ``folder`` or ``None`` if it is incomplete."""
+
+    try:
+        assets = _load_game_assets(folder)
+    except ValueError:
+        return None
+    return assets if assets.front_cards else None
+
+
 def generate_pdf(
     game: GameAssets,
     card_counts: Dict[str, int],
     output_dir: Path | str,
+    jpeg_quality: int = 75,
+    dpi: int = DEFAULT_DPI,
 ) -> Path:
-    """Create the PDF document for the requested game configuration."""
+    """Create the PDF document for the requested game configuration.
 
-    normalized_counts = {
-        card: int(max(0, value)) for card, value in card_counts.items()
-    }
+    ``card_counts`` maps each card's ``key`` to a non-negative integer. Pages are rendered
+    at ``dpi``, at most ``DEFAULT_DPI`` (the printed size does not change), and
+    embedded as JPEG streams encoded at ``jpeg_quality`` (Pillow's default of
+    75; higher values produce noticeably larger files).
+    """
 
-    total_front_cards = sum(normalized_counts.values())
+    assert all(value >= 0 for value in card_counts.values())
+    if not 1 <= dpi <= DEFAULT_DPI:
+        raise ValueError(f"La resolución debe estar entre 1 y {DEFAULT_DPI} DPI.")
+
+    total_front_cards = sum(card_counts.values())
     if total_front_cards <= 0:
         raise ValueError("Selecciona al menos una carta para generar el documento.")
 
@@ -93,27 +148,30 @@ def generate_pdf(
     document_name = f"{game.name.upper()}_{timestamp}.pdf"
     document_path = output_path / document_name
 
-    front_sequence = _iter_front_sequence(game.front_cards, normalized_counts)
-    layout_positions = _compute_layout_positions()
+    layout = _page_layout(dpi)
+    card_size = (layout.card_width, layout.card_height)
 
-    front_pages = _render_pages(front_sequence, layout_positions)
+    prepared: Dict[Path, np.ndarray] = {}
+    front_sequence = _iter_card_sequence(
+        _front_requests(game.cards_by_key, card_counts), prepared, card_size
+    )
 
     back_count = total_front_cards
-    back_sequence = _iter_back_sequence(game.back_card.path, back_count)
-    back_pages = _render_pages(back_sequence, layout_positions)
+    back_pixels = _prepared_pixels(game.back_card.path, prepared, card_size)
 
-    pages = front_pages + back_pages
-    if not pages:
-        raise RuntimeError("No fue posible generar el PDF solicitado.")
+    n_front_pages = -(-total_front_cards // CARDS_PER_PAGE)
+    n_back_pages = n_front_pages
 
-    first_page, *other_pages = pages
-    first_page.save(  # type: ignore[attr-defined]
-        document_path,
-        "PDF",
-        resolution=300,
-        save_all=True,
-        append_images=other_pages,
-    )
+    with ThreadPoolExecutor(max_workers=_RENDER_WORKERS) as executor:
+        rendered_pages = chain(
+            _render_pages(front_sequence, layout, executor),
+            _iter_back_pages(back_pixels, back_count, layout, executor),
+        )
+        page_total = _write_pages(rendered_pages, document_path, dpi, jpeg_quality)
+
+    if page_total != n_front_pages + n_back_pages:
+        document_path.unlink(missing_ok=True)
+        raise RuntimeError("No fue posible generar el PDF solicitado.")
 
     return document_path
 
@@ -147,101 +205,198 @@ def _load_game_assets(folder: Path) -> GameAssets:
     )
 
 
-def _iter_front_sequence(
-    cards: Sequence[CardAsset],
+def _front_requests(
+    cards: Mapping[str, CardAsset],
     counts: Dict[str, int],
-) -> Iterator[Image.Image]:
-    for card in cards:
-        count = counts.get(card.name, 0)
-        if count <= 0:
+) -> Iterator[Tuple[Path, int]]:
+    for card_key, count in counts.items():
+        card = cards.get(card_key)
+        if card is None or count <= 0:
             continue
-        image = _load_card_image(card.path)
-        try:
-            for _ in range(count):
-                yield image.copy()
-        finally:
-            image.close()
+        yield card.path, count
 
 
-def _iter_back_sequence(path: Path, count: int) -> Iterator[Image.Image]:
-    if count <= 0:
-        return
-    image = _load_card_image(path)
-    try:
+def _iter_card_sequence(
+    requests: Iterable[Tuple[Path, int]],
+    prepared: Dict[Path, np.ndarray],
+    card_size: Tuple[int, int],
+) -> Iterator[np.ndarray]:
+    for path, count in requests:
+        if count <= 0:
+            continue
+        pixels = _prepared_pixels(path, prepared, card_size)
         for _ in range(count):
-            yield image.copy()
-    finally:
+            yield pixels
+
+
+def _prepared_pixels(
+    path: Path,
+    prepared: Dict[Path, np.ndarray],
+    card_size: Tuple[int, int],
+) -> np.ndarray:
+    pixels = prepared.get(path)
+    if pixels is None:
+        image = _load_card_image(path, card_size)
+        pixels = np.asarray(image)
         image.close()
+        prepared[path] = pixels
+    return pixels
 
 
 def _render_pages(
-    card_sequence: Iterable[Image.Image],
-    positions: Sequence[Tuple[int, int]],
-) -> List[Image.Image]:
-    pages: List[Image.Image] = []
-
-    position_total = len(positions)
-    assert position_total == CARDS_PER_PAGE
-
-    new_page = _blank_page
-    current_page = None
-    slot_index = 0
-
-    for card_image in card_sequence:
-        if current_page is None:
-            current_page = new_page()
-        x, y = positions[slot_index]
-        if card_image.mode == "RGBA":
-            alpha = card_image.getchannel("A")
-            current_page.paste(card_image, (x, y), alpha)
-            alpha.close()
-        else:
-            current_page.paste(card_image, (x, y))
-        card_image.close()
-        slot_index += 1
-
-        if slot_index == position_total:
-            rgb_page = current_page.convert("RGB")
-            current_page.close()
-            pages.append(rgb_page)
-            current_page = None
-            slot_index = 0
-
-    if current_page is not None and slot_index > 0:
-        rgb_page = current_page.convert("RGB")
-        current_page.close()
-        pages.append(rgb_page)
-
-    return pages
-
-
-def _blank_page() -> Image.Image:
-    return Image.new("RGBA", (PAGE_WIDTH, PAGE_HEIGHT), (255, 255, 255, 255))
-
-
-def _load_card_image(path: Path) -> Image.Image:
+    card_sequence: Iterable[np.ndarray],
+    layout: _PageLayout,
+    executor: ThreadPoolExecutor,
+) -> Iterator[Image.Image]:
+    assert len(layout.positions) == CARDS_PER_PAGE
+
+    # Only keep one page per worker in flight so memory stays bounded.
+    pending: Deque[Future[Image.Image]] = deque()
+    for batch in _batched(card_sequence, CARDS_PER_PAGE):
+        pending.append(executor.submit(_render_single_page, batch, layout))
+        if len(pending) >= _RENDER_WORKERS:
+            page = pending.popleft().result()
+            yield page
+            page.close()
+    while pending:
+        page = pending.popleft().result()
+        yield page
+        page.close()
+
+
+def _iter_back_pages(
+    back_pixels: np.ndarray,
+    count: int,
+    layout: _PageLayout,
+    executor: ThreadPoolExecutor,
+) -> Iterator[Image.Image]:
+    full_pages, remainder = divmod(count, CARDS_PER_PAGE)
+    if full_pages:
+        # Every full back page is identical, so it is composed only once.
+        template = executor.submit(
+            _render_single_page, [back_pixels] * CARDS_PER_PAGE, layout
+        ).result()
+        try:
+            for _ in range(full_pages):
+                yield template
+        finally:
+            template.close()
+    yield from _render_pages(repeat(back_pixels, remainder), layout, executor)
+
+
+def _render_single_page(
+    batch: Sequence[np.ndarray],
+    layout: _PageLayout,
+) -> Image.Image:
+    page = _blank_page(layout)
+    for (x, y), card_pixels in zip(layout.positions, batch):
+        blit_card(page, y, x, card_pixels, layout.card_mask)
+    return Image.fromarray(page)
+
+
+def _batched(items: Iterable[np.ndarray], size: int) -> Iterator[List[np.ndarray]]:
+    # Card i always lands on page i // size, in slot i % size.
+    for _, group in groupby(enumerate(items), key=lambda item: item[0] // size):
+        yield [card for _, card in group]
+
+
+def _write_pages(
+    pages: Iterable[Image.Image],
+    document_path: Path,
+    dpi: int,
+    jpeg_quality: int,
+) -> int:
+    page_total = 0
+    previous_page: Optional[Image.Image] = None
+    image_ref = 0
+    try:
+        with PdfStreamWriter(document_path, resolution=dpi) as writer:
+            for page in pages:
+                # Repeated pages (the back template) share one embedded image.
+                if page is not previous_page:
+                    image_ref = writer.add_image(page, jpeg_quality)
+                    previous_page = page
+                writer.add_page(image_ref, page.size)
+                page_total += 1
+    except Exception:
+        document_path.unlink(missing_ok=True)
+        raise
+    return page_total
+
+
+def _blank_page(layout: _PageLayout) -> np.ndarray:
+    # Image.fromarray copies RGB data, so each render thread can keep reusing
+    # one page buffer instead of allocating a new one per page.
+    shape = (layout.page_height, layout.page_width, 3)
+    buffer = getattr(_page_buffers, "page", None)
+    if buffer is None or buffer.shape != shape:
+        buffer = np.empty(shape, dtype=np.uint8)
+        _page_buffers.page = buffer
+    buffer.fill(255)
+    return buffer
+
+
+def _load_card_image(path: Path, size: Tuple[int, int]) -> Image.Image:
+    width, height = size
     with Image.open(path) as source:
+        # Lets libjpeg downscale large JPEGs while decoding; a no-op for other formats.
+        source.draft("RGB", (width * 2, height * 2))
         image = source.convert("RGBA") if source.mode not in {"RGB", "RGBA"} else source.copy()
-    image = ImageOps.fit(image, (CARD_WIDTH, CARD_HEIGHT), RESAMPLE)
-    if image.mode != "RGBA":
-        image = image.convert("RGBA")
-    image.putalpha(_CARD_ALPHA_MASK)
-    return image
+    return ImageOps.fit(image, size, RESAMPLE).convert("RGB")
+
+
+@lru_cache(maxsize=8)
+def _page_layout(dpi: int) -> _PageLayout:
+    scale = dpi / DEFAULT_DPI
+    page_width = max(1, round(PAGE_WIDTH * scale))
+    page_height = max(1, round(PAGE_HEIGHT * scale))
+    card_width = max(1, round(CARD_WIDTH * scale))
+    card_height = max(1, round(CARD_HEIGHT * scale))
+    spacing = round(CARD_SPACING * scale)
+    radius = round(CARD_CORNER_RADIUS * scale)
+
+    positions = _compute_layout_positions(
+        page_width, page_height, card_width, card_height, spacing
+    )
+    return _PageLayout(
+        page_width=page_width,
+        page_height=page_height,
+        card_width=card_width,
+        card_height=card_height,
+        positions=tuple(positions),
+        card_mask=_create_card_mask(card_width, card_height, radius),
+    )
+
+
+def _create_card_mask(width: int, height: int, corner_radius: int) -> np.ndarray:
+    radius = min(corner_radius, width // 2, height // 2)
+    rows, cols = np.ogrid[:height, :width]
+    dy = np.maximum(np.maximum(radius - rows, rows - (height - 1 - radius)), 0)
+    dx = np.maximum(np.maximum(radius - cols, cols - (width - 1 - radius)), 0)
+    mask = np.zeros((height, width), dtype=np.uint8)
+    mask[dy * dy + dx * dx <= radius * radius] = 255
+    return mask
 
 
-def _compute_layout_positions() -> List[Tuple[int, int]]:
-    effective_width = COLUMN_COUNT * CARD_WIDTH + (COLUMN_COUNT - 1) * CARD_SPACING
-    effective_height = ROW_COUNT * CARD_HEIGHT + (ROW_COUNT - 1) * CARD_SPACING
+def _compute_layout_positions(
+    page_width: int,
+    page_height: int,
+    card_width: int,
+    card_height: int,
+    spacing: int,
+) -> List[Tuple[int, int]]:
+    effective_width = COLUMN_COUNT * card_width + (COLUMN_COUNT - 1) * spacing
+    effective_height = ROW_COUNT * card_height + (ROW_COUNT - 1) * spacing
 
-    margin_x = (PAGE_WIDTH - effective_width) / 2
-    margin_y = (PAGE_HEIGHT - effective_height) / 2
+    margin_x = (page_width - effective_width) / 2
+    margin_y = (page_height - effective_height) / 2
 
     x_positions = [
-        int(round(margin_x + col * (CARD_WIDTH + CARD_SPACING)))
+        int(round(margin_x + col * (card_width + spacing)))
         for col in range(COLUMN_COUNT)
     ]
     y_positions = [
-        int(round(margin_y + row * (CARD_HEIGHT + CARD_SPACING)))
+        int(round(margin_y + row * (card_height + spacing)))
         for row in range(ROW_COUNT)
     ]
 
@@ -0,0 +1,44 @@
+"""Compiled pixel kernels used to compose the PDF pages."""
+
+from __future__ import annotations
+
+import numpy as np
+from numba import njit, types
+
+
+_PAGE_TYPE = types.Array(types.uint8, 3, "C")
+# Inputs are declared read-only: card pixels come from np.asarray on a PIL
+# image, which is read-only, and writable arrays still match these types.
+_CARD_TYPE = types.Array(types.uint8, 3, "C", readonly=True)
+_MASK_TYPE = types.Array(types.uint8, 2, "C", readonly=True)
+
+
+# The explicit signature compiles the kernel when this module is imported (or
+# loads it from the on-disk cache), so the first PDF request pays no JIT cost.
+# Pages are already rendered in parallel by a thread pool, so the kernel
+# releases the GIL instead of spawning its own worker threads.
+@njit(
+    types.void(_PAGE_TYPE, types.intp, types.intp, _CARD_TYPE, _MASK_TYPE),
+    nogil=True,
+    cache=True,
+)
+def blit_card(
+    page: np.ndarray,
+    y0: int,
+    x0: int,
+    card: np.ndarray,
+    mask: np.ndarray,
+) -> None:
+    """Copy the ``card`` pixels selected by ``mask`` into ``page`` at (x0, y0).
+
+    No bounds checks are done: callers must keep ``y0 + mask.shape[0] <=
+    page.shape[0]`` and ``x0 + mask.shape[1] <= page.shape[1]``, otherwise the
+    kernel silently writes past the page buffer.
+    """
+
+    height, width = mask.shape
+    for y in range(height):
+        for x in range(width):
+            if mask[y, x]:
+                for channel in range(3):
+                    page[y0 + y, x0 + x, channel] = card[y, x, channel]
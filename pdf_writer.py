@@ -0,0 +1,116 @@
+"""Single-pass PDF writer for documents made of full-page JPEG images."""
+
+from __future__ import annotations
+
+import io
+from pathlib import Path
+from types import TracebackType
+from typing import BinaryIO, Dict, List, Optional, Tuple, Type
+
+from PIL import Image
+
+
+_CATALOG_REF = 1
+_PAGES_REF = 2
+
+
+class PdfStreamWriter:
+    """Append JPEG pages to a PDF file without rereading what was written.
+
+    Every image and page object goes to disk as soon as it is added. The page
+    tree, catalog and cross-reference table are written once by ``close``, so
+    the cost of each page does not depend on how many came before it.
+    """
+
+    def __init__(self, path: Path | str, resolution: float) -> None:
+        self._file: BinaryIO = open(path, "wb")
+        self._resolution = resolution
+        self._offsets: Dict[int, int] = {}
+        self._next_ref = _PAGES_REF + 1
+        self._page_refs: List[int] = []
+        self._file.write(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+
+    def __enter__(self) -> PdfStreamWriter:
+        return self
+
+    def __exit__(
+        self,
+        exc_type: Optional[Type[BaseException]],
+        exc: Optional[BaseException],
+        traceback: Optional[TracebackType],
+    ) -> None:
+        if exc_type is None:
+            self.close()
+        else:
+            self._file.close()
+
+    def add_image(self, image: Image.Image, quality: int) -> int:
+        """Embed ``image`` as a JPEG XObject and return its object number."""
+
+        buffer = io.BytesIO()
+        image.save(buffer, "JPEG", quality=quality)
+        data = buffer.getvalue()
+        width, height = image.size
+        header = (
+            f"<< /Type /XObject /Subtype /Image /Width {width} /Height {height}"
+            f" /ColorSpace /DeviceRGB /BitsPerComponent 8 /Filter /DCTDecode"
+            f" /Length {len(data)} >>"
+        )
+        return self._write_stream(header, data)
+
+    def add_page(self, image_ref: int, size: Tuple[int, int]) -> None:
+        """Add a page showing the image ``image_ref`` of ``size`` pixels."""
+
+        width = size[0] * 72.0 / self._resolution
+        height = size[1] * 72.0 / self._resolution
+        content = f"q {width:.4f} 0 0 {height:.4f} 0 0 cm /Im0 Do Q".encode("ascii")
+        content_ref = self._write_stream(f"<< /Length {len(content)} >>", content)
+        page = (
+            f"<< /Type /Page /Parent {_PAGES_REF} 0 R"
+            f" /MediaBox [0 0 {width:.4f} {height:.4f}]"
+            f" /Resources << /XObject << /Im0 {image_ref} 0 R >> >>"
+            f" /Contents {content_ref} 0 R >>"
+        )
+        self._page_refs.append(self._write_object(page))
+
+    def close(self) -> None:
+        """Write the page tree, catalog and cross-reference table."""
+
+        kids = " ".join(f"{ref} 0 R" for ref in self._page_refs)
+        self._write_object(
+            f"<< /Type /Pages /Kids [{kids}] /Count {len(self._page_refs)} >>",
+            ref=_PAGES_REF,
+        )
+        self._write_object(
+            f"<< /Type /Catalog /Pages {_PAGES_REF} 0 R >>", ref=_CATALOG_REF
+        )
+
+        xref_offset = self._file.tell()
+        size = self._next_ref
+        lines = [f"xref\n0 {size}\n", "0000000000 65535 f \n"]
+        lines.extend(f"{self._offsets[ref]:010d} 00000 n \n" for ref in range(1, size))
+        lines.append(
+            f"trailer\n<< /Size {size} /Root {_CATALOG_REF} 0 R >>\n"
+            f"startxref\n{xref_offset}\n%%EOF\n"
+        )
+        self._file.write("".join(lines).encode("ascii"))
+        self._file.close()
+
+    def _write_object(self, body: str, ref: Optional[int] = None) -> int:
+        ref = self._reserve(ref)
+        self._file.write(f"{ref} 0 obj\n{body}\nendobj\n".encode("ascii"))
+        return ref
+
+    def _write_stream(self, header: str, data: bytes) -> int:
+        ref = self._reserve(None)
+        self._file.write(f"{ref} 0 obj\n{header}\nstream\n".encode("ascii"))
+        self._file.write(data)
+        self._file.write(b"\nendstream\nendobj\n")
+        return ref
+
+    def _reserve(self, ref: Optional[int]) -> int:
+        if ref is None:
+            ref = self._next_ref
+            self._next_ref += 1
+        self._offsets[ref] = self._file.tell()
+        return ref